@@ -2,8 +2,7 @@ import os
 from dotenv import load_dotenv
 
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
 load_dotenv()
 
@@ -11,9 +10,15 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 
 engine = create_engine(
     DATABASE_URL,
-    echo=True,              # Show SQL logs (optional)
-    pool_size=5,            # Connection pool size
-    max_overflow=10,        # Extra connections
+    echo=bool(int(os.getenv("SQL_ECHO", "0"))),  # Set SQL_ECHO=1 to log SQL statements (debugging only)
+    echo_pool=False,        # Don't log connection pool checkouts/checkins
+    # Each worker process can open up to pool_size + max_overflow connections,
+    # so keep (workers * that total) below PostgreSQL's max_connections.
+    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),         # Connection pool size
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),   # Extra connections under load
+    pool_pre_ping=True,     # Detect connections dropped by the server before using them
+    pool_recycle=3600,      # Replace connections older than an hour
+    pool_timeout=10,        # Fail fast instead of queueing 30s for a free connection
     future=True             # SQLAlchemy 2.0 mode
 )
 SessionLocal = sessionmaker(
@@ -22,7 +27,9 @@ SessionLocal = sessionmaker(
     bind=engine,
 )
 
-Base = declarative_base()
+class Base(DeclarativeBase):
+    """Declarative base class for all ORM models."""
+    pass
 
 def get_db():
     """
@@ -1,48 +1,100 @@
 import os
+from threading import Lock
+
 import jwt
-from fastapi import FastAPI, HTTPException, Depends, status
+from cachetools import TTLCache
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 from fastapi.security import OAuth2PasswordRequestForm
-from utils import authenticate_user, create_access_token, get_current_user, oauth2_scheme, hash_password
+from utils import authenticate_user, create_access_token, decode_access_token, get_current_user, oauth2_scheme, hash_password
 from database import get_db
+from sqlalchemy import and_, delete, exists, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from models import Group, User as UserModel
+from models import Group, User as UserModel, user_group_association
 
 from schemas import LoginData, RegisterUser, User, TokenData, RefreshTokenData, GroupCreate, GroupResponse, GroupMemberAction
 from redis_client import publish_to_redis, close_redis
 
 load_dotenv()
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
+# Cache of user IDs keyed by email, so authenticated requests don't re-query the users table
+user_id_cache = TTLCache(maxsize=5000, ttl=300)
+user_id_cache_lock = Lock()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)  # Serialize responses with orjson
 
 # Add CORS middleware
+# Explicit origins (comma separated in CORS_ORIGINS) instead of echoing back any Origin with credentials
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000,http://localhost:3001,http://127.0.0.1:3001").split(",")
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins in development
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],  # Allow all methods
-    allow_headers=["*"],  # Allow all headers
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["authorization", "content-type"],
 )
 
+# ======================= Helper Functions ===============================
+def get_user_id(db: Session, email: str) -> int | None:
+    """
+    Get the ID of the user with the given email.
+    Served from user_id_cache when possible, otherwise selects only the primary key.
+    Returns None if no such user exists.
+    """
+    with user_id_cache_lock:
+        user_id = user_id_cache.get(email)
+    if user_id is not None:
+        return user_id
+
+    user_id = db.execute(select(UserModel.id).where(UserModel.email == email)).scalar_one_or_none()
+    if user_id is not None:
+        with user_id_cache_lock:
+            user_id_cache[email] = user_id
+    return user_id
+
+
+def is_member(db: Session, user_id: int, group_id: int) -> bool:
+    """
+    Check if a user is a member of a group with a single EXISTS query,
+    without loading the group's members collection.
+    """
+    stmt = select(exists().where(and_(
+        user_group_association.c.user_id == user_id,
+        user_group_association.c.group_id == group_id
+    )))
+    return db.execute(stmt).scalar()
+
+
+def get_group_with_user(db: Session, group_id: int, email: str):
+    """
+    Fetch a group's creator and name together with the ID and name of the user with the given email,
+    in a single query. Returns None if the group doesn't exist; user_id is None if the user doesn't.
+    """
+    return db.execute(
+        select(
+            Group.created_by,
+            Group.name,
+            UserModel.id.label("user_id"),
+            UserModel.name.label("user_name")
+        )
+        .outerjoin(UserModel, UserModel.email == email)
+        .where(Group.id == group_id)
+    ).first()
+
+
 @app.post("/register", response_model=User)
 def register(user_data: RegisterUser, db: Session = Depends(get_db)):
     """
     Register a new user.
-    Checks if email already exists and creates a new user with bcrypt hashed password.
+    Creates a new user with Argon2id hashed password.
+    Duplicate emails are rejected by the unique index on users.email.
     """
-    # Check if user already exists
-    existing_user = db.query(UserModel).filter(UserModel.email == user_data.email).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Hash the password using bcrypt
+    # Hash the password using Argon2id
     hashed_password = hash_password(user_data.password)
     
     # Create new user
@@ -53,16 +105,21 @@ def register(user_data: RegisterUser, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     db.refresh(new_user)
     
-    return User(
-        id=new_user.id,
-        email=new_user.email,
-        name=new_user.name,
-        created_at=new_user.created_at.isoformat(),
-        updated_at=new_user.updated_at.isoformat()
-    )
+    # Drop any stale cached ID for this email
+    with user_id_cache_lock:
+        user_id_cache.pop(new_user.email, None)
+    
+    return User.model_validate(new_user)
 
 
 @app.post("/login", response_model=TokenData)
@@ -87,10 +144,10 @@ def verify_token(token: str = Depends(oauth2_scheme)):
     Verify JWT token validity.
     Uses oauth2_scheme to automatically extract and validate token from Authorization header.
     Supports both GET and POST methods for nginx auth_request compatibility.
+    Verified payloads are cached so repeated checks of the same token skip the signature verification.
     """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return {"valid": True, "user": payload["sub"]}
+        payload = decode_access_token(token)
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -101,10 +158,11 @@ def verify_token(token: str = Depends(oauth2_scheme)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
+    return {"valid": True, "user": payload["sub"]}
 
 
 @app.post("/token", response_model=TokenData)
-async def login_for_access_token(
+def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -141,36 +199,30 @@ def create_group(
     The creator is automatically added as a member of the group.
     """
     # Get the user from database
-    user = db.query(UserModel).filter(UserModel.email == current_user["email"]).first()
+    user_id = get_user_id(db, current_user["email"])
     
-    if not user:
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Create new group with authenticated user's ID
-    new_group = Group(
-        name=group_data.name,
-        description=group_data.description,
-        created_by=user.id
-    )
+    # Create new group with authenticated user's ID, returning the generated columns
+    new_group = db.execute(
+        insert(Group)
+        .values(
+            name=group_data.name,
+            description=group_data.description,
+            created_by=user_id
+        )
+        .returning(Group.id, Group.name, Group.description, Group.created_at, Group.updated_at)
+    ).one()
     
     # Add the creator as a member of the group
-    new_group.members.append(user)
-    
-    db.add(new_group)
+    db.execute(insert(user_group_association).values(user_id=user_id, group_id=new_group.id))
     db.commit()
-    db.refresh(new_group)
     
-    return GroupResponse(
-        id=new_group.id,
-        name=new_group.name,
-        description=new_group.description,
-        created_by=user.email,
-        created_at=new_group.created_at.isoformat(),
-        updated_at=new_group.updated_at.isoformat()
-    )
+    return GroupResponse.model_validate({**new_group._mapping, "creator_email": current_user["email"]})
 
 @app.get("/verify-group-access/{group_id}")
 def verify_group_access(
@@ -183,26 +235,24 @@ def verify_group_access(
     Returns 200 if user is a member, 403 if not.
     """
     # Get the user from database
-    user = db.query(UserModel).filter(UserModel.email == current_user["email"]).first()
+    user_id = get_user_id(db, current_user["email"])
     print(current_user, group_id)
-    if not user:
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
     # Check if group exists
-    group = db.query(Group).filter(Group.id == group_id).first()
-    if not group:
+    group_name = db.execute(select(Group.name).where(Group.id == group_id)).scalar_one_or_none()
+    if group_name is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Group not found"
         )
     
     # Check if user is a member of the group
-    is_member = user in group.members
-    
-    if not is_member:
+    if not is_member(db, user_id, group_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not a member of this group"
@@ -210,9 +260,9 @@ def verify_group_access(
     
     return {
         "valid": True,
-        "user": user.email,
+        "user": current_user["email"],
         "group_id": group_id,
-        "group_name": group.name
+        "group_name": group_name
     }
 
 @app.get("/groups")
@@ -223,51 +273,58 @@ def get_user_groups(
     """
     Get all groups the authenticated user is a member of.
     """
-    user = db.query(UserModel).filter(UserModel.email == current_user["email"]).first()
+    user_id = get_user_id(db, current_user["email"])
     
-    if not user:
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    groups = [
-        GroupResponse(
-            id=group.id,
-            name=group.name,
-            description=group.description,
-            created_by=group.creator.email,
-            created_at=group.created_at.isoformat(),
-            updated_at=group.updated_at.isoformat()
+    # Fetch the groups together with their creator's email in a single query
+    rows = db.execute(
+        select(
+            Group.id,
+            Group.name,
+            Group.description,
+            UserModel.email.label("creator_email"),
+            Group.created_at,
+            Group.updated_at
         )
-        for group in user.groups
-    ]
+        .join(user_group_association, user_group_association.c.group_id == Group.id)
+        .join(UserModel, UserModel.id == Group.created_by)
+        .where(user_group_association.c.user_id == user_id)
+    ).all()
+    
+    groups = [GroupResponse.model_validate(row) for row in rows]
     
     return {"groups": groups}
 
 
 @app.post("/groups/{group_id}/members")
-async def add_member_to_group(
+def add_member_to_group(
     group_id: int,
     member_data: GroupMemberAction,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Add a user to a group.
     Only the group creator can add members.
+    Declared sync so FastAPI runs the blocking DB work in its threadpool.
     """
     # Get the current user
-    current_user_obj = db.query(UserModel).filter(UserModel.email == current_user["email"]).first()
+    current_user_id = get_user_id(db, current_user["email"])
     
-    if not current_user_obj:
+    if current_user_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user not found"
         )
     
-    # Check if group exists
-    group = db.query(Group).filter(Group.id == group_id).first()
+    # Check if group exists (and look up the user to add in the same query)
+    group = get_group_with_user(db, group_id, member_data.user_email)
     if not group:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -275,39 +332,42 @@ async def add_member_to_group(
         )
     
     # Check if current user is the creator of the group
-    if group.created_by != current_user_obj.id:
+    if group.created_by != current_user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only the group creator can add members"
         )
     
-    # Find the user to add
-    user_to_add = db.query(UserModel).filter(UserModel.email == member_data.user_email).first()
-    if not user_to_add:
+    # Check the user to add exists
+    if group.user_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with email {member_data.user_email} not found"
         )
     
-    # Check if user is already a member
-    if user_to_add in group.members:
+    # Add user to group; no row is returned if they already are a member
+    added = db.execute(
+        pg_insert(user_group_association)
+        .values(user_id=group.user_id, group_id=group_id)
+        .on_conflict_do_nothing()
+        .returning(user_group_association.c.user_id)
+    ).first()
+    if added is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"User {member_data.user_email} is already a member of this group"
         )
-    
-    # Add user to group
-    group.members.append(user_to_add)
     db.commit()
     
-    # Publish to Redis for real-time notification
-    await publish_to_redis(
+    # Publish to Redis for real-time notification once the response has been sent
+    background_tasks.add_task(
+        publish_to_redis,
         "added_to_group",
         {
             "type": "add",
             "group_id": group_id,
             "user_email": member_data.user_email,
-            "text": f"{user_to_add.name} ({member_data.user_email}) was added to {group.name}",
+            "text": f"{group.user_name} ({member_data.user_email}) was added to {group.name}",
             "added_by": current_user["email"]
         }
     )
@@ -321,9 +381,10 @@ async def add_member_to_group(
 
 
 @app.delete("/groups/{group_id}/members")
-async def remove_member_from_group(
+def remove_member_from_group(
     group_id: int,
     member_data: GroupMemberAction,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -331,18 +392,19 @@ async def remove_member_from_group(
     Remove a user from a group.
     Only the group creator can remove members.
     Users cannot remove themselves if they are the creator.
+    Declared sync so FastAPI runs the blocking DB work in its threadpool.
     """
     # Get the current user
-    current_user_obj = db.query(UserModel).filter(UserModel.email == current_user["email"]).first()
+    current_user_id = get_user_id(db, current_user["email"])
     
-    if not current_user_obj:
+    if current_user_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user not found"
         )
     
-    # Check if group exists
-    group = db.query(Group).filter(Group.id == group_id).first()
+    # Check if group exists (and look up the user to remove in the same query)
+    group = get_group_with_user(db, group_id, member_data.user_email)
     if not group:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -350,46 +412,51 @@ async def remove_member_from_group(
         )
     
     # Check if current user is the creator of the group
-    if group.created_by != current_user_obj.id:
+    if group.created_by != current_user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only the group creator can remove members"
         )
     
-    # Find the user to remove
-    user_to_remove = db.query(UserModel).filter(UserModel.email == member_data.user_email).first()
-    if not user_to_remove:
+    # Check the user to remove exists
+    if group.user_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with email {member_data.user_email} not found"
         )
     
     # Check if trying to remove the creator
-    if user_to_remove.id == group.created_by:
+    if group.user_id == group.created_by:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot remove the group creator from the group"
         )
     
-    # Check if user is a member
-    if user_to_remove not in group.members:
+    # Remove user from group; no row is returned if they weren't a member
+    removed = db.execute(
+        delete(user_group_association)
+        .where(and_(
+            user_group_association.c.user_id == group.user_id,
+            user_group_association.c.group_id == group_id
+        ))
+        .returning(user_group_association.c.user_id)
+    ).first()
+    if removed is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"User {member_data.user_email} is not a member of this group"
         )
-    
-    # Remove user from group
-    group.members.remove(user_to_remove)
     db.commit()
     
-    # Publish to Redis for real-time notification
-    await publish_to_redis(
+    # Publish to Redis for real-time notification once the response has been sent
+    background_tasks.add_task(
+        publish_to_redis,
         "remove_from_group",
         {
             "type": "leave",
             "group_id": group_id,
             "user_email": member_data.user_email,
-            "text": f"{user_to_remove.name} ({member_data.user_email}) was removed from {group.name}",
+            "text": f"{group.user_name} ({member_data.user_email}) was removed from {group.name}",
             "removed_by": current_user["email"]
         }
     )
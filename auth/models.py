@@ -1,14 +1,16 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Table
-from sqlalchemy.orm import relationship
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Table, Index
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from database import Base
 
 class TimestampMixin:
-    created_at = Column(
+    created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
         nullable=False
     )
-    updated_at = Column(
+    updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
         onupdate=func.now(),
@@ -22,31 +24,33 @@ user_group_association = Table(
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
     Column('group_id', Integer, ForeignKey('groups.id', ondelete='CASCADE'), primary_key=True),
-    Column('joined_at', DateTime(timezone=True), server_default=func.now(), nullable=False)
+    Column('joined_at', DateTime(timezone=True), server_default=func.now(), nullable=False),
+    # The primary key covers (user_id, group_id); this covers lookups by group first
+    Index('ix_uga_group_user', 'group_id', 'user_id')
 )
 
 
 class User(TimestampMixin, Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True)
-    email = Column(String, unique=True, index=True)
-    name = Column(String)
-    password = Column(String)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    email: Mapped[str | None] = mapped_column(String, unique=True, index=True)
+    name: Mapped[str | None] = mapped_column(String)
+    password: Mapped[str | None] = mapped_column(String)
     
     # Relationships
-    groups = relationship("Group", secondary=user_group_association, back_populates="members")
-    created_groups = relationship("Group", back_populates="creator", foreign_keys="Group.created_by")
+    groups: Mapped[list["Group"]] = relationship(secondary=user_group_association, back_populates="members")
+    created_groups: Mapped[list["Group"]] = relationship(back_populates="creator", foreign_keys="Group.created_by")
 
 
 class Group(TimestampMixin, Base):
     __tablename__ = "groups"
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)
-    description = Column(String, nullable=True)
-    created_by = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    description: Mapped[str | None] = mapped_column(String, nullable=True)
+    created_by: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     
     # Relationships
-    creator = relationship("User", back_populates="created_groups", foreign_keys=[created_by])
-    members = relationship("User", secondary=user_group_association, back_populates="groups")
+    creator: Mapped["User"] = relationship(back_populates="created_groups", foreign_keys=[created_by])
+    members: Mapped[list["User"]] = relationship(secondary=user_group_association, back_populates="groups")
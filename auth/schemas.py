@@ -1,4 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from datetime import datetime
+
+from pydantic import AliasChoices, AliasPath, BaseModel, ConfigDict, EmailStr, Field
 
 
 class LoginData(BaseModel):
@@ -14,11 +16,10 @@ class User(BaseModel):
     id: int
     email: EmailStr
     name: str
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class TokenData(BaseModel):
     access_token: str | None = None
@@ -37,12 +38,12 @@ class GroupResponse(BaseModel):
     id: int
     name: str
     description: str | None
-    created_by: str  # Email of the creator
-    created_at: str
-    updated_at: str
+    # Email of the creator, read from Group.creator or a "creator_email" column of a row
+    created_by: str = Field(validation_alias=AliasChoices(AliasPath("creator", "email"), "creator_email"))
+    created_at: datetime
+    updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class GroupMemberAction(BaseModel):
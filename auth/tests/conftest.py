@@ -7,7 +7,7 @@ import sys
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from dotenv import load_dotenv
@@ -33,21 +33,53 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-@pytest.fixture(scope="function")
-def test_db():
-    """Create a fresh database for each test"""
+# pysqlite manages transactions itself and breaks SAVEPOINT support;
+# let SQLAlchemy emit BEGIN so per-test rollbacks work
+@event.listens_for(engine, "connect")
+def do_connect(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def do_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+@pytest.fixture(scope="session")
+def db_schema():
+    """Create the tables once for the whole test session"""
     Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="function")
+def test_db(db_schema):
+    """
+    Give each test a session inside an outer transaction that is rolled back afterwards.
+    Commits made by the app only release a SAVEPOINT, so no data leaks between tests.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
     try:
         yield db
     finally:
         db.close()
-        Base.metadata.drop_all(bind=engine)
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    """Single test client (and app startup/shutdown) shared by all tests"""
+    with TestClient(app) as test_client:
+        yield test_client
 
 
 @pytest.fixture(scope="function")
-def client(test_db):
-    """Create a test client with database dependency override"""
+def client(app_client, test_db):
+    """Test client with database dependency override"""
     def override_get_db():
         try:
             yield test_db
@@ -55,8 +87,7 @@ def client(test_db):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
-    with TestClient(app) as test_client:
-        yield test_client
+    yield app_client
     app.dependency_overrides.clear()
 
 
@@ -110,6 +110,59 @@ class TestLoginEndpoint:
         assert response.status_code in [status.HTTP_200_OK, status.HTTP_401_UNAUTHORIZED]
 
 
+    def test_login_with_registered_user(self, client, valid_user_data):
+        """Test login with a user created through /register (Argon2id hashed password)"""
+        response = client.post("/register", json=valid_user_data)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.post("/login", json={
+            "email": valid_user_data["email"],
+            "password": valid_user_data["password"]
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "access_token" in response.json()
+
+    def test_login_upgrades_legacy_bcrypt_hash(self, client, test_db, valid_user_data):
+        """Test that a legacy bcrypt hash is replaced with Argon2id on successful login"""
+        import bcrypt
+        from models import User
+
+        legacy_hash = bcrypt.hashpw(valid_user_data["password"].encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        test_db.add(User(email=valid_user_data["email"], name=valid_user_data["name"], password=legacy_hash))
+        test_db.commit()
+
+        response = client.post("/login", json={
+            "email": valid_user_data["email"],
+            "password": valid_user_data["password"]
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        user = test_db.query(User).filter(User.email == valid_user_data["email"]).first()
+        assert user.password.startswith("$argon2id$")
+
+
+class TestRegisterEndpoint:
+    """Test cases for POST /register endpoint"""
+
+    def test_register_success(self, client, valid_user_data):
+        """Test registering a new user"""
+        response = client.post("/register", json=valid_user_data)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["email"] == valid_user_data["email"]
+        assert data["name"] == valid_user_data["name"]
+        assert "password" not in data
+
+    def test_register_duplicate_email(self, client, valid_user_data):
+        """Test that registering the same email twice is rejected"""
+        client.post("/register", json=valid_user_data)
+        response = client.post("/register", json=valid_user_data)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["detail"] == "Email already registered"
+
 class TestTokenEndpoint:
     """Test cases for POST /token endpoint (OAuth2 format)"""
 
@@ -208,3 +261,42 @@ class TestVerifyTokenEndpoint:
         response = client.post("/verify-token", headers=headers)
         
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_verify_token_repeated_requests_are_cached(self, client, monkeypatch):
+        """Test that a token is verified once and then served from the cache on repeat requests"""
+        from utils import create_access_token, token_cache, token_verifier
+
+        token = create_access_token(data={"sub": "testuser@example.com"})
+        headers = {"Authorization": f"Bearer {token}"}
+        token_cache.clear()
+
+        verify = token_verifier.verify
+        calls = []
+
+        def counting_verify(token):
+            calls.append(token)
+            return verify(token)
+
+        monkeypatch.setattr(token_verifier, "verify", counting_verify)
+
+        first = client.post("/verify-token", headers=headers)
+        second = client.get("/verify-token", headers=headers)
+
+        assert first.status_code == status.HTTP_200_OK
+        assert second.json() == first.json()
+        assert calls == [token]
+
+    def test_verify_token_without_subject(self, client, env_settings):
+        """Test that a correctly signed token missing the 'sub' claim is rejected"""
+        from datetime import datetime, timedelta, timezone
+        import jwt
+
+        token = jwt.encode(
+            {"exp": datetime.now(timezone.utc) + timedelta(minutes=5)},
+            env_settings["SECRET_KEY"],
+            algorithm=env_settings["ALGORITHM"]
+        )
+        response = client.post("/verify-token", headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.json()["detail"] == "Invalid token"
@@ -89,6 +89,21 @@ class TestProtectedRoutes:
             assert response1.json() == response2.json()
 
 
+    def test_repeated_requests_reuse_cached_token(self, client):
+        """Test that a token is verified once and then served from the token cache"""
+        from utils import create_access_token, token_cache
+
+        token = create_access_token(data={"sub": "cached@example.com"})
+        headers = {"Authorization": f"Bearer {token}"}
+        token_cache.clear()
+
+        response1 = client.get("/users/me", headers=headers)
+        response2 = client.get("/users/me", headers=headers)
+
+        assert response1.status_code == status.HTTP_200_OK
+        assert response2.json() == {"email": "cached@example.com"}
+        assert len(token_cache) == 1
+
 class TestAuthenticationFlow:
     """Test complete authentication flows"""
 
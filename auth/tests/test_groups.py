@@ -0,0 +1,160 @@
+"""
+Test cases for group endpoints
+"""
+import pytest
+from fastapi import status
+
+
+@pytest.fixture(autouse=True)
+def reset_state(monkeypatch):
+    """Clear cached user IDs and stub out Redis publishing for each test"""
+    import main
+
+    async def fake_publish(channel, message):
+        pass
+
+    monkeypatch.setattr(main, "publish_to_redis", fake_publish)
+    main.user_id_cache.clear()
+    yield
+    main.user_id_cache.clear()
+
+
+def register_and_login(client, email, name="Test User", password="testpass123"):
+    """Register a user and return authorization headers for them"""
+    client.post("/register", json={"email": email, "name": name, "password": password})
+    response = client.post("/login", json={"email": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def owner_headers(client):
+    """Authorization headers for the group creator"""
+    return register_and_login(client, "owner@example.com", name="Owner")
+
+
+@pytest.fixture
+def member_headers(client):
+    """Authorization headers for a second user"""
+    return register_and_login(client, "member@example.com", name="Member")
+
+
+@pytest.fixture
+def group_id(client, owner_headers):
+    """Create a group owned by the owner and return its ID"""
+    response = client.post("/groups", json={"name": "Movie Night", "description": "Weekly"}, headers=owner_headers)
+    return response.json()["id"]
+
+
+class TestCreateGroup:
+    """Test cases for POST /groups endpoint"""
+
+    def test_create_group(self, client, owner_headers):
+        """Test that a group is created with the authenticated user as creator"""
+        response = client.post("/groups", json={"name": "Movie Night", "description": "Weekly"}, headers=owner_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["name"] == "Movie Night"
+        assert data["description"] == "Weekly"
+        assert data["created_by"] == "owner@example.com"
+
+    def test_create_group_without_token(self, client):
+        """Test that creating a group requires authentication"""
+        response = client.post("/groups", json={"name": "Movie Night"})
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestListGroups:
+    """Test cases for GET /groups endpoint"""
+
+    def test_creator_sees_own_group(self, client, owner_headers, group_id):
+        """Test that the creator is listed as a member of the new group"""
+        response = client.get("/groups", headers=owner_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        groups = response.json()["groups"]
+        assert [group["id"] for group in groups] == [group_id]
+        assert groups[0]["created_by"] == "owner@example.com"
+
+    def test_non_member_sees_no_groups(self, client, member_headers, group_id):
+        """Test that users only see groups they belong to"""
+        response = client.get("/groups", headers=member_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["groups"] == []
+
+
+class TestVerifyGroupAccess:
+    """Test cases for GET /verify-group-access/{group_id} endpoint"""
+
+    def test_member_has_access(self, client, owner_headers, group_id):
+        """Test that a member is granted access"""
+        response = client.get(f"/verify-group-access/{group_id}", headers=owner_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["valid"] is True
+        assert data["user"] == "owner@example.com"
+        assert data["group_name"] == "Movie Night"
+
+    def test_non_member_is_forbidden(self, client, member_headers, group_id):
+        """Test that a non-member is denied access"""
+        response = client.get(f"/verify-group-access/{group_id}", headers=member_headers)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_unknown_group(self, client, owner_headers):
+        """Test access check against a group that does not exist"""
+        response = client.get("/verify-group-access/999", headers=owner_headers)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestGroupMembers:
+    """Test cases for adding and removing group members"""
+
+    def test_add_and_remove_member(self, client, owner_headers, member_headers, group_id):
+        """Test the full add -> access -> remove -> no access flow"""
+        member = {"user_email": "member@example.com"}
+
+        response = client.post(f"/groups/{group_id}/members", json=member, headers=owner_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get(f"/verify-group-access/{group_id}", headers=member_headers).status_code == status.HTTP_200_OK
+
+        response = client.request("DELETE", f"/groups/{group_id}/members", json=member, headers=owner_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get(f"/verify-group-access/{group_id}", headers=member_headers).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_add_existing_member(self, client, owner_headers, member_headers, group_id):
+        """Test that adding a user twice is rejected"""
+        member = {"user_email": "member@example.com"}
+        client.post(f"/groups/{group_id}/members", json=member, headers=owner_headers)
+
+        response = client.post(f"/groups/{group_id}/members", json=member, headers=owner_headers)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_add_unknown_user(self, client, owner_headers, group_id):
+        """Test that adding a user who does not exist returns 404"""
+        response = client.post(f"/groups/{group_id}/members", json={"user_email": "nobody@example.com"}, headers=owner_headers)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_only_creator_can_add_members(self, client, owner_headers, member_headers, group_id):
+        """Test that a non-creator cannot add members"""
+        response = client.post(f"/groups/{group_id}/members", json={"user_email": "owner@example.com"}, headers=member_headers)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_remove_non_member(self, client, owner_headers, member_headers, group_id):
+        """Test that removing a user who is not a member is rejected"""
+        response = client.request("DELETE", f"/groups/{group_id}/members", json={"user_email": "member@example.com"}, headers=owner_headers)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_cannot_remove_creator(self, client, owner_headers, group_id):
+        """Test that the group creator cannot be removed"""
+        response = client.request("DELETE", f"/groups/{group_id}/members", json={"user_email": "owner@example.com"}, headers=owner_headers)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -1,14 +1,21 @@
 import os
+import time
+import hashlib
 from datetime import datetime, timedelta, timezone
+from threading import Lock
+
 import bcrypt
+from cachetools import TLRUCache
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.openapi.models import OAuthFlows as OAuthFlowsModel
-from fastapi.security.utils import get_authorization_scheme_param
 # from jose import jwt, JWTError
 import jwt
 from dotenv import load_dotenv
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 from schemas import LoginData
 
@@ -17,22 +24,61 @@ load_dotenv()
 
 # Security settings
 SECRET_KEY = os.getenv("SECRET_KEY")
+SECRET_KEY_BYTES = SECRET_KEY.encode() if SECRET_KEY else None  # Encoded once for the HMAC key
 ALGORITHM = os.getenv("ALGORITHM", "HS256").strip('"')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
+JWT_ALGORITHMS = [ALGORITHM]
+
+
+class TokenVerifier:
+    """
+    Verifies access tokens with a key, algorithms and required claims fixed at construction.
+    Built once at import and shared by every request; if tokens are ever signed with
+    RS256/OIDC, a cached PyJWKClient belongs in here rather than in the request path.
+    """
+
+    def __init__(self, key, algorithms: list):
+        self._decoder = jwt.PyJWT(options={"require": ["exp", "sub"]})
+        self._key = key
+        self._algorithms = algorithms
+
+    def verify(self, token: str) -> dict:
+        return self._decoder.decode(token, self._key, algorithms=self._algorithms)
+
+
+token_verifier = TokenVerifier(SECRET_KEY_BYTES, JWT_ALGORITHMS)
+
+# Cache of verified token payloads, keyed by a digest of the raw token.
+# Entries expire at the token's own "exp", and are kept for at most TOKEN_CACHE_TTL seconds.
+TOKEN_CACHE_TTL = 3600
+
+
+def _token_ttu(key, payload, now):
+    return min(payload["exp"], now + TOKEN_CACHE_TTL)
+
+
+token_cache = TLRUCache(maxsize=10_000, ttu=_token_ttu, timer=time.time)
+token_cache_lock = Lock()
+
 
 class CustomOAuth2PasswordBearer(OAuth2PasswordBearer):
     async def __call__(self, request: Request) -> str:
-        authorization: str = request.headers.get("Authorization")
-        scheme, param = get_authorization_scheme_param(authorization)
-        
-        if not authorization or scheme.lower() != "bearer":
+        # Scan the raw ASGI headers (names are already lowercase) instead of building request.headers
+        token = None
+        for name, value in request.scope["headers"]:
+            if name == b"authorization":
+                # Case-insensitive "Bearer " prefix check, then slice off the token
+                if value[:7].lower() == b"bearer ":
+                    token = value[7:].strip().decode("latin-1")
+                break
+        if not token:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Authentication token is missing or invalid. Please provide a valid Bearer token.",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        return param
+        return token
 
 
 # OAuth2 scheme for token authentication
@@ -41,25 +87,43 @@ oauth2_scheme = CustomOAuth2PasswordBearer(tokenUrl="token")
 
 # ==================== Password Hashing Utils ====================
 
+# Argon2id cost, defaulting to the OWASP recommended parameters (19 MiB memory, 2 iterations, 1 lane).
+# Hashes made with other parameters are upgraded on the next successful login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 2))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 19456))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 1))
+
+password_hasher = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM
+)
+
+# Prefix of the legacy bcrypt hashes ($2a$, $2b$, $2y$) stored before the switch to Argon2id
+BCRYPT_PREFIX = "$2"
+
+# Hash verified against when the email is unknown, so a failed login costs the same
+# whether or not the account exists (no timing oracle for valid emails)
+DUMMY_HASH = password_hasher.hash("dummy-password")
+
+
 def hash_password(password: str) -> str:
     """
-    Hash a password using bcrypt.
+    Hash a password using Argon2id.
     
     Args:
         password: Plain text password
         
     Returns:
-        Hashed password string
+        Hashed password string in PHC format
     """
-    # Generate salt and hash password
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    return password_hasher.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a password against its hash.
+    Legacy bcrypt hashes are still accepted so existing users can log in and be upgraded.
     
     Args:
         plain_password: Plain text password to verify
@@ -68,7 +132,28 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         True if password matches, False otherwise
     """
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    if hashed_password.startswith(BCRYPT_PREFIX):
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Check if a stored hash is bcrypt or uses outdated Argon2 parameters.
+    
+    Args:
+        hashed_password: Hashed password from database
+        
+    Returns:
+        True if the hash should be replaced on the next successful login
+    """
+    if hashed_password.startswith(BCRYPT_PREFIX):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)
 
 
 def authenticate_user(user: LoginData, db: Session = None):
@@ -82,18 +167,61 @@ def authenticate_user(user: LoginData, db: Session = None):
             return {"email": user.email}
         return None
     
-    # Query user from database
+    # Query only the columns needed from the database
     from models import User as UserModel
-    db_user = db.query(UserModel).filter(UserModel.email == user.email).first()
+    db_user = db.execute(
+        select(UserModel.id, UserModel.email, UserModel.password)
+        .where(UserModel.email == user.email)
+    ).first()
     
     if not db_user:
+        verify_password(user.password, DUMMY_HASH)
         return None
     
-    # Verify password using bcrypt
+    # Verify password using Argon2id (or bcrypt for legacy hashes)
     if not verify_password(user.password, db_user.password):
         return None
     
-    return {"email": db_user.email, "id": db_user.id, "name": db_user.name}
+    # Lazily upgrade legacy or outdated hashes now that we know the plain password
+    if password_needs_rehash(db_user.password):
+        db.execute(
+            update(UserModel)
+            .where(UserModel.id == db_user.id)
+            .values(password=hash_password(user.password))
+        )
+        db.commit()
+    
+    return {"email": db_user.email, "id": db_user.id}
+
+
+# ==================== Token Utils ====================
+
+def decode_access_token(token: str) -> dict:
+    """
+    Decode and verify a JWT access token.
+    Verified payloads are cached until the token expires, so repeated requests
+    with the same token skip the signature verification.
+    
+    Args:
+        token: Encoded JWT token string
+        
+    Returns:
+        Token payload (always contains "sub" and "exp")
+        
+    Raises:
+        jwt.ExpiredSignatureError: If the token has expired
+        jwt.InvalidTokenError: If the token is malformed, badly signed or missing claims
+    """
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    with token_cache_lock:
+        payload = token_cache.get(cache_key)
+    if payload is not None:
+        return payload
+
+    payload = token_verifier.verify(token)
+    with token_cache_lock:
+        token_cache[cache_key] = payload
+    return payload
 
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
@@ -104,13 +232,10 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
     )
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_email = payload.get("sub")
-        if user_email is None:
-            raise credentials_exception
-        return {"email": user_email}
-    except jwt.ExpiredSignatureError:
+        payload = decode_access_token(token)
+    except jwt.InvalidTokenError:
         raise credentials_exception
+    return {"email": payload["sub"]}
     
 def create_access_token(data: dict):
     """
@@ -125,5 +250,5 @@ def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
\ No newline at end of file
@@ -1,13 +1,18 @@
 import os
+import time
+import asyncio
+import logging
+import orjson
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
-from typing import List, Optional, Dict
+from typing import Optional, Dict, Set
 
 from fastapi import  WebSocket, WebSocketDisconnect
-from datetime import datetime, timezone
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # ======================== MongoDB Connection ========================
 
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
@@ -26,68 +31,94 @@ class ConnectionManager:
     """Manages WebSocket connections for chat"""
     
     def __init__(self):
-        # Store active connections: {group_id: [websocket1, websocket2, ...]}
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+        # Store active connections: {group_id: {websocket1, websocket2, ...}}
+        self.active_connections: Dict[int, Set[WebSocket]] = {}
         # Store current video state for each group: {group_id: {video_name, video_time, is_playing, last_updated}}
         self.group_video_state: Dict[int, dict] = {}
     
-    async def connect(self, websocket: WebSocket, group_id: int):
-        """Accept and store a new WebSocket connection"""
-        await websocket.accept()
+    def connect(self, websocket: WebSocket, group_id: int):
+        """Store a new, already accepted WebSocket connection"""
         if group_id not in self.active_connections:
-            self.active_connections[group_id] = []
-        self.active_connections[group_id].append(websocket)
+            self.active_connections[group_id] = set()
+        self.active_connections[group_id].add(websocket)
     
     def disconnect(self, websocket: WebSocket, group_id: int):
         """Remove a WebSocket connection"""
         if group_id in self.active_connections:
-            self.active_connections[group_id].remove(websocket)
+            self.active_connections[group_id].discard(websocket)
             if not self.active_connections[group_id]:
                 # No more users in the group, clean up
                 del self.active_connections[group_id]
                 # Clear video state for this group
                 if group_id in self.group_video_state:
                     del self.group_video_state[group_id]
-                    print(f"🧹 Cleared video state for empty group {group_id}")
+                    logger.debug("Cleared video state for empty group %s", group_id)
     
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """Send message to a specific connection"""
         await websocket.send_json(message)
     
     async def broadcast(self, message: dict, group_id: int):
-        """Broadcast message to all connections in a group"""
+        """Broadcast message to all connections in a group concurrently, dropping connections that fail"""
         if group_id in self.active_connections:
-            for connection in self.active_connections[group_id]:
-                await connection.send_json(message)
+            # Snapshot the group: other coroutines may disconnect while the sends are in flight
+            connections = list(self.active_connections[group_id])
+            # Serialize once for the whole group instead of once per connection
+            payload = orjson.dumps(message).decode()
+            results = await asyncio.gather(
+                *(connection.send_text(payload) for connection in connections),
+                return_exceptions=True
+            )
+            for connection, result in zip(connections, results):
+                if isinstance(result, Exception):
+                    self.disconnect(connection, group_id)
     
+    @staticmethod
+    def _on_play(state: dict, video_name: Optional[str], video_time: Optional[float]):
+        state["is_playing"] = True
+        if video_time is not None:
+            state["video_time"] = video_time
+        if video_name:
+            state["video_name"] = video_name
+
+    @staticmethod
+    def _on_pause(state: dict, video_name: Optional[str], video_time: Optional[float]):
+        state["is_playing"] = False
+        if video_time is not None:
+            state["video_time"] = video_time
+
+    @staticmethod
+    def _on_seek(state: dict, video_name: Optional[str], video_time: Optional[float]):
+        if video_time is not None:
+            state["video_time"] = video_time
+
+    @staticmethod
+    def _on_change_video(state: dict, video_name: Optional[str], video_time: Optional[float]):
+        state["video_name"] = video_name
+        state["video_time"] = video_time if video_time is not None else 0
+        # Keep current is_playing state or default to False if not set
+        if "is_playing" not in state:
+            state["is_playing"] = False
+
+    @staticmethod
+    def _on_unknown(state: dict, video_name: Optional[str], video_time: Optional[float]):
+        pass
+
+    # Video action -> state handler, a single dict lookup per video control event
+    _VIDEO_ACTIONS = {
+        "play": _on_play,
+        "pause": _on_pause,
+        "seek": _on_seek,
+        "change_video": _on_change_video,
+    }
+
     def update_video_state(self, group_id: int, video_action: str, video_name: str = None, video_time: float = None):
         """Update the current video state for a group"""
-        if group_id not in self.group_video_state:
-            self.group_video_state[group_id] = {}
-        
-        state = self.group_video_state[group_id]
-        
-        if video_action == "play":
-            state["is_playing"] = True
-            if video_time is not None:
-                state["video_time"] = video_time
-            if video_name:
-                state["video_name"] = video_name
-        elif video_action == "pause":
-            state["is_playing"] = False
-            if video_time is not None:
-                state["video_time"] = video_time
-        elif video_action == "seek":
-            if video_time is not None:
-                state["video_time"] = video_time
-        elif video_action == "change_video":
-            state["video_name"] = video_name
-            state["video_time"] = video_time if video_time is not None else 0
-            # Keep current is_playing state or default to False if not set
-            if "is_playing" not in state:
-                state["is_playing"] = False
+        state = self.group_video_state.setdefault(group_id, {})
+        self._VIDEO_ACTIONS.get(video_action, self._on_unknown)(state, video_name, video_time)
         
-        state["last_updated"] = datetime.now(timezone.utc).isoformat()
+        # Raw epoch seconds; only format it if it is ever sent to clients
+        state["last_updated"] = time.time()
     
     def get_video_state(self, group_id: int) -> Optional[dict]:
         """Get the current video state for a group"""
@@ -1,17 +1,41 @@
-import json
 import asyncio
+import logging
+import hashlib
+import time
+import jwt
+import orjson
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional, Dict
 from datetime import datetime, timezone
 import httpx
+from bson import ObjectId
+from cachetools import TLRUCache
 
 from connection import messages_collection as collection
 from connection import client, manager
 from schemas import MessageCreate
 from redis_client import get_redis, close_redis
 
-app = FastAPI()
+
+
+class MongoJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also serializes MongoDB ObjectIds (datetimes are handled by orjson itself)"""
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        raise TypeError
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=self._default, option=orjson.OPT_NON_STR_KEYS)
+
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(default_response_class=ORJSONResponse)  # Serialize responses with orjson
 
 # Add CORS middleware
 app.add_middleware(
@@ -24,56 +48,115 @@ app.add_middleware(
 
 AUTH_SERVICE_URL = "http://127.0.0.1:8000"
 
+# Shared client so connections to the auth service are kept alive and reused
+auth_http_client = httpx.AsyncClient(
+    base_url=AUTH_SERVICE_URL,
+    timeout=5.0,
+    limits=httpx.Limits(max_keepalive_connections=50, max_connections=100)
+)
+
+# Successful group access checks keyed by (token digest, group_id).
+# Entries for a group are dropped when a member is removed from it (see redis_subscriber).
+# Each entry is (token exp, user info) and lives ACCESS_CACHE_TTL seconds, or until the token expires if sooner.
+ACCESS_CACHE_TTL = 300
+
+
+def _access_ttu(key, value, now):
+    return min(value[0], now + ACCESS_CACHE_TTL)
+
+
+access_cache = TLRUCache(maxsize=50_000, ttu=_access_ttu, timer=time.time)
+
+# Chat messages are written to MongoDB in batches by message_writer instead of one insert per message.
+# A batch is flushed when it reaches MESSAGE_BATCH_SIZE or MESSAGE_FLUSH_INTERVAL seconds after its first message.
+MESSAGE_BATCH_SIZE = 200
+MESSAGE_FLUSH_INTERVAL = 0.02
+message_queue: asyncio.Queue = asyncio.Queue()
+message_writer_task: Optional[asyncio.Task] = None
+
 # ======================= Helper Functions ===============================
 async def verify_user_group_membership(token: str, group_id: int) -> dict:
     """
     Verify if user has access to the group by calling auth service.
     Returns user info if authorized, raises HTTPException if not.
+    Successful checks are cached in access_cache.
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{AUTH_SERVICE_URL}/verify-group-access/{group_id}",
-                headers={"Authorization": f"Bearer {token}"}
+    cache_key = (hashlib.blake2b(token.encode(), digest_size=16).digest(), group_id)
+    cached = access_cache.get(cache_key)
+    if cached is not None:
+        return cached[1]
+
+    try:
+        response = await auth_http_client.get(
+            f"/verify-group-access/{group_id}",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        
+        if response.status_code == 200:
+            user_info = response.json()
+            # The auth service already verified the signature; exp only bounds how long the result is reused
+            exp = jwt.decode(token, options={"verify_signature": False}).get("exp", float("inf"))
+            access_cache[cache_key] = (exp, user_info)
+            return user_info
+        elif response.status_code == 403:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You are not a member of this group"
             )
-            
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 403:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="You are not a member of this group"
-                )
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Authentication failed"
-                )
-        except httpx.RequestError:
+        else:
             raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Authentication service unavailable"
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Authentication failed"
             )
+    except httpx.RequestError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service unavailable"
+        )
 
 
-@app.get("/messages")
-async def get_messages():
-    """Get all messages from MongoDB"""
-    messages = []
-    async for message in collection.find().sort("created_at", -1).limit(100):
-        # Convert ObjectId to string
-        message["_id"] = str(message["_id"])
-        messages.append(message)
-    
-    return {"messages": messages}
+async def receive_json(websocket: WebSocket):
+    """
+    Receive one frame and parse it with orjson.
+    Binary frames are parsed as-is and text frames are accepted too, so browser clients keep working.
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    raw = message.get("bytes")
+    return orjson.loads(raw if raw is not None else message["text"])
+
+
+def invalidate_group_access(group_id: int):
+    """Drop all cached access checks for a group"""
+    for key in [key for key in access_cache if key[1] == group_id]:
+        access_cache.pop(key, None)
+
+
+# Fields returned by GET /messages (_id is always included)
+MESSAGE_PROJECTION = {"text": 1, "user": 1, "group_id": 1, "type": 1, "created_at": 1}
+
+
+@app.get("/messages", response_class=MongoJSONResponse)
+async def get_messages(group_id: Optional[int] = None):
+    """Get the latest 100 messages from MongoDB, optionally for a single group"""
+    query = {"group_id": group_id} if group_id is not None else {}
+    messages = await collection.find(query, MESSAGE_PROJECTION).sort("created_at", -1).to_list(100)
+    # Returned directly so ObjectIds and datetimes are serialized in a single orjson pass
+    return MongoJSONResponse({"messages": messages})
 
 
 # @app.post("/messages")
 async def create_message(message: MessageCreate):
-    """Create a new message with timestamp"""
+    """
+    Create a new message with timestamp.
+    The document is queued for the batched writer, so the caller can broadcast it
+    without waiting for the MongoDB round trip.
+    """
     current_time = datetime.now(timezone.utc)
     
     document = {
+        "_id": ObjectId(),  # Generated here since the insert happens later
         "text": message.text,
         "user": message.user,
         "group_id": message.group_id,
@@ -82,10 +165,35 @@ async def create_message(message: MessageCreate):
         "updated_at": current_time
     }
     
-    result = await collection.insert_one(document)
-    document["_id"] = str(result.inserted_id)
+    message_queue.put_nowait(document)
     
-    return {"success": True, "document": document}
+    # Return a copy, the queued document must keep its ObjectId and datetimes
+    return {"success": True, "document": {**document, "_id": str(document["_id"])}}
+
+
+async def flush_messages(batch: list):
+    """Insert a batch of queued messages into MongoDB"""
+    try:
+        await collection.insert_many(batch, ordered=False)
+    except Exception as e:
+        logger.error("Error saving %d messages: %s", len(batch), e)
+
+
+async def message_writer():
+    """
+    Background task that drains message_queue into MongoDB with insert_many.
+    """
+    while True:
+        batch = [await message_queue.get()]
+        try:
+            # Give a burst a moment to accumulate before writing it out
+            await asyncio.sleep(MESSAGE_FLUSH_INTERVAL)
+        except asyncio.CancelledError:
+            await flush_messages(batch)  # Don't drop the batch in hand on shutdown
+            raise
+        while len(batch) < MESSAGE_BATCH_SIZE and not message_queue.empty():
+            batch.append(message_queue.get_nowait())
+        await flush_messages(batch)
 
 
 @app.websocket("/ws/group/{group_id}")
@@ -105,15 +213,23 @@ async def websocket_endpoint(websocket: WebSocket, group_id: int):
         await websocket.close(code=1008, reason="Authentication token required")
         return
     
-    # Verify user has access to this group
+    # Verify group access while the handshake completes, so connecting costs
+    # max(auth round trip, accept) rather than their sum
+    auth_task = asyncio.create_task(verify_user_group_membership(token, group_id))
+    try:
+        await websocket.accept()
+    except Exception:
+        auth_task.cancel()
+        raise
+    
     try:
-        user_info = await verify_user_group_membership(token, group_id)
+        user_info = await auth_task
         user_email = user_info["user"]
     except HTTPException as e:
         await websocket.close(code=1008, reason=e.detail)
         return
 
-    await manager.connect(websocket, group_id)
+    manager.connect(websocket, group_id)
     
     # Send current video state to the newly connected user (if exists)
     video_state = manager.get_video_state(group_id)
@@ -126,15 +242,18 @@ async def websocket_endpoint(websocket: WebSocket, group_id: int):
             "message": "Syncing with current video playback"
         }
         await manager.send_personal_message(sync_message, websocket)
-        print(f"Sent video sync to {user_email}: {video_state.get('video_name')} at {video_state.get('video_time', 0)}s, playing={video_state.get('is_playing', False)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Sent video sync to %s: %s at %ss, playing=%s",
+                user_email, video_state.get("video_name"), video_state.get("video_time", 0), video_state.get("is_playing", False)
+            )
     else:
-        print(f"No video state to sync for group {group_id}")
+        logger.debug("No video state to sync for group %s", group_id)
     
     try:
         while True:
             # Receive message from client
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = await receive_json(websocket)
             message_data["group_id"] = group_id if not message_data.get("group_id") else message_data.get("group_id")
             message_data["user"] = user_email  # Override user with authenticated user email
             
@@ -162,27 +281,23 @@ async def websocket_endpoint(websocket: WebSocket, group_id: int):
                 
                 # Broadcast video control to all users in the group
                 await manager.broadcast(video_control, group_id)
-                print(f"Video control broadcast: {video_action} by {user_email} in group {group_id}")
+                logger.debug("Video control broadcast: %s by %s in group %s", video_action, user_email, group_id)
                 
             else:
                 # Regular chat message
                 message_data["type"] = "message"  # Force type to be "message" for regular chat
                 
                 # Validate message_data
-                data = MessageCreate(**message_data)
+                data = MessageCreate.model_validate(message_data)
 
                 # Call the create_message function to save message
                 result = await create_message(data)
                 if not result.get("success"):
                     continue  # Skip broadcasting if saving failed
                 
-                # Convert datetime objects to ISO format strings for JSON serialization
-                document = result["document"]
-                document["created_at"] = document["created_at"].isoformat()
-                document["updated_at"] = document["updated_at"].isoformat()
-                
-                # Broadcast to all users in the group (only for regular messages)
-                await manager.broadcast(document, group_id)
+                # Broadcast to all users in the group (only for regular messages).
+                # orjson formats the datetimes as ISO strings in the same pass as the rest of the payload.
+                await manager.broadcast(result["document"], group_id)
             
     except WebSocketDisconnect:
         manager.disconnect(websocket, group_id)
@@ -192,7 +307,7 @@ async def websocket_endpoint(websocket: WebSocket, group_id: int):
             "message": f"User disconnected from group {group_id}"
         }, group_id)
     except Exception as e:
-        print(f"Error in websocket: {e}")
+        logger.error("Error in websocket: %s", e)
         manager.disconnect(websocket, group_id)
 
 
@@ -205,49 +320,46 @@ async def redis_subscriber():
     pubsub = redis_client.pubsub()
     await pubsub.subscribe("added_to_group", "remove_from_group")
     
-    print("Redis subscriber started, listening to group membership channels...")
+    logger.info("Redis subscriber started, listening to group membership channels...")
     
     try:
         async for message in pubsub.listen():
             # message["type"] == "message" means Redis received actual data (not subscription confirmation)
             if message["type"] == "message":
                 try:
-                    data = json.loads(message["data"])
+                    data = orjson.loads(message["data"])
                     group_id = data.get("group_id")
                     message_type = data.get("type")  # "add" or "leave"
                     text = data.get("text")
                     
-                    notification_data = {
-                        "type": message_type,
+                    # A removed member must not keep access through a cached check
+                    if message["channel"] == "remove_from_group":
+                        invalidate_group_access(group_id)
+                    
+                    # Notifications come from the auth service, so the document is built directly
+                    # instead of going through MessageCreate and create_message
+                    current_time = datetime.now(timezone.utc)
+                    document = {
+                        "_id": ObjectId(),
                         "text": text,
                         "user": "system",
                         "group_id": group_id,
+                        "type": message_type,
+                        "created_at": current_time,
+                        "updated_at": current_time
                     }
-
-                    data = MessageCreate(**notification_data)
-
-                     # Call the create_message function to save message
-                    result = await create_message(data)
-                    if not result.get("success"):
-                        continue  # Skip broadcasting if saving failed
-                    
-                    # Convert datetime objects to ISO format strings for JSON serialization
-                    document = result["document"]
-                    document["created_at"] = document["created_at"].isoformat()
-                    document["updated_at"] = document["updated_at"].isoformat()
+                    message_queue.put_nowait(document)
                     
-                    # Broadcast to all users in the group (only for regular messages)
-                    await manager.broadcast(document, group_id)
-                        
-                    # Broadcast to all connected users in the group
-                    print(f"Broadcasted {message_type} notification to group {group_id}: {text}")
+                    # Broadcast to all connected users in the group (orjson serializes the datetimes)
+                    await manager.broadcast({**document, "_id": str(document["_id"])}, group_id)
+                    logger.debug("Broadcasted %s notification to group %s: %s", message_type, group_id, text)
                     
-                except json.JSONDecodeError as e:
-                    print(f"Error decoding Redis message: {e}")
+                except orjson.JSONDecodeError as e:
+                    logger.error("Error decoding Redis message: %s", e)
                 except Exception as e:
-                    print(f"Error processing Redis message: {e}")
+                    logger.error("Error processing Redis message: %s", e)
     except Exception as e:
-        print(f"Redis subscriber error: {e}")
+        logger.error("Redis subscriber error: %s", e)
     finally:
         await pubsub.unsubscribe("added_to_group", "remove_from_group")
         await pubsub.close()
@@ -255,12 +367,26 @@ async def redis_subscriber():
 
 @app.on_event("startup")
 async def startup_event():
-    """Start Redis subscriber on application startup"""
+    """Create MongoDB indexes and start the Redis subscriber and message writer on application startup"""
+    global message_writer_task
+    # Serve GET /messages from an index instead of a collection scan and in-memory sort
+    await collection.create_index([("group_id", 1), ("created_at", -1)])
+    await collection.create_index([("created_at", -1)])
     asyncio.create_task(redis_subscriber())
+    message_writer_task = asyncio.create_task(message_writer())
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    """Close MongoDB and Redis connections on shutdown"""
+    """Flush pending messages, then close MongoDB, Redis and auth service connections on shutdown"""
+    if message_writer_task:
+        message_writer_task.cancel()
+        await asyncio.gather(message_writer_task, return_exceptions=True)
+    pending = []
+    while not message_queue.empty():
+        pending.append(message_queue.get_nowait())
+    if pending:
+        await flush_messages(pending)
     client.close()
     await close_redis()
+    await auth_http_client.aclose()
@@ -1,33 +1,97 @@
 import redis.asyncio as redis
-from typing import Dict
-import json
+from typing import Dict, Optional
+import asyncio
+import logging
 import os
+import orjson
 
-# Redis connection
+logger = logging.getLogger(__name__)
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 32))
+
+# Most PUBLISH commands sent in one pipeline round trip, and how long (seconds) the publisher
+# waits after the first queued message so a burst (e.g. a video scrub) goes out together
+PUBLISH_BATCH_SIZE = 100
+PUBLISH_FLUSH_INTERVAL = 0.005
+
+# Redis connection pool and the client built on it
+redis_pool: redis.BlockingConnectionPool = None
 redis_client: redis.Redis = None
 
+# Messages waiting for the background publisher, as (channel, payload)
+publish_queue: Optional[asyncio.Queue] = None
+publisher_task: Optional[asyncio.Task] = None
+
+
 async def get_redis():
     """Get Redis client instance"""
-    global redis_client
+    global redis_pool, redis_client
     if redis_client is None:
         redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-        redis_client = await redis.from_url(
+        redis_pool = redis.BlockingConnectionPool.from_url(
             redis_url,
+            max_connections=REDIS_MAX_CONNECTIONS,
             encoding="utf-8",
             decode_responses=True
         )
+        redis_client = redis.Redis(connection_pool=redis_pool)
     return redis_client
 
 
-async def publish_to_redis(channel: str, message: Dict):
-    """Publish message to Redis channel"""
+async def _publish_batch(client: redis.Redis, batch: list):
+    """Send a batch of queued messages as one pipeline"""
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            for channel, payload in batch:
+                pipe.publish(channel, payload)
+            await pipe.execute()
+    except Exception as e:
+        logger.error("Error publishing %d messages to Redis: %s", len(batch), e)
+
+
+async def _publisher():
+    """Background task that drains publish_queue, pipelining each burst of messages"""
     client = await get_redis()
-    await client.publish(channel, json.dumps(message))
+    while True:
+        batch = [await publish_queue.get()]
+        try:
+            await asyncio.sleep(PUBLISH_FLUSH_INTERVAL)
+        except asyncio.CancelledError:
+            await _publish_batch(client, batch)  # Don't drop the batch in hand on shutdown
+            raise
+        while len(batch) < PUBLISH_BATCH_SIZE and not publish_queue.empty():
+            batch.append(publish_queue.get_nowait())
+        await _publish_batch(client, batch)
+
+
+async def publish_to_redis(channel: str, message: Dict):
+    """
+    Publish message to Redis channel.
+    The message is queued and sent by a background publisher, so callers don't wait on Redis.
+    """
+    global publish_queue, publisher_task
+    if publisher_task is None:
+        publish_queue = asyncio.Queue()
+        publisher_task = asyncio.create_task(_publisher())
+    # Serialized with orjson straight to bytes, which redis sends without re-encoding
+    publish_queue.put_nowait((channel, orjson.dumps(message)))
 
 
 async def close_redis():
-    """Close Redis connection"""
-    global redis_client
+    """Flush queued messages, then close the Redis connection pool"""
+    global redis_pool, redis_client, publish_queue, publisher_task
+    if publisher_task:
+        publisher_task.cancel()
+        await asyncio.gather(publisher_task, return_exceptions=True)
+        pending = []
+        while not publish_queue.empty():
+            pending.append(publish_queue.get_nowait())
+        if pending:
+            await _publish_batch(await get_redis(), pending)
+        publish_queue = None
+        publisher_task = None
     if redis_client:
-        await redis_client.close()
+        await redis_client.aclose()
+        await redis_pool.disconnect()
         redis_client = None
+        redis_pool = None
@@ -1,7 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, Literal
 
 class MessageCreate(BaseModel):
+    # Validated once and only read afterwards (see create_message)
+    model_config = ConfigDict(frozen=True)
+    
     text: str
     user: str
     group_id: Optional[int] = None
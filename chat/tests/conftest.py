@@ -0,0 +1,8 @@
+"""
+Pytest configuration for chat service tests
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
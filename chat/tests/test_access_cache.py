@@ -0,0 +1,58 @@
+"""
+Tests for the cached group access check
+"""
+import asyncio
+import jwt
+import pytest
+from cachetools import TLRUCache
+from fastapi import HTTPException
+
+import main
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace access_cache with one driven by a fake clock"""
+    now = [1000.0]
+    monkeypatch.setattr(main, "access_cache", TLRUCache(maxsize=100, ttu=main._access_ttu, timer=lambda: now[0]))
+    return now
+
+
+def test_cached_access_expires_with_token(clock, monkeypatch):
+    """A cached access check is not reused once the token has expired"""
+    token = jwt.encode({"sub": "alice", "exp": 1010}, "secret", algorithm="HS256")
+    responses = [FakeResponse(200, {"valid": True, "user": "alice", "group_id": 1, "group_name": "g"}), FakeResponse(401)]
+    calls = []
+
+    async def fake_get(url, headers):
+        calls.append(url)
+        return responses[len(calls) - 1]
+
+    monkeypatch.setattr(main.auth_http_client, "get", fake_get)
+
+    assert asyncio.run(main.verify_user_group_membership(token, 1))["user"] == "alice"
+    clock[0] = 1005
+    assert asyncio.run(main.verify_user_group_membership(token, 1))["user"] == "alice"
+    assert len(calls) == 1
+
+    # Well inside the 300 s cache TTL, but past the token's exp
+    clock[0] = 1011
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main.verify_user_group_membership(token, 1))
+    assert exc.value.status_code == 401
+    assert len(calls) == 2
+
+
+def test_access_ttu_caps_at_cache_ttl():
+    """Long-lived tokens are still rechecked after ACCESS_CACHE_TTL"""
+    assert main._access_ttu(None, (10_000, {}), 1000) == 1000 + main.ACCESS_CACHE_TTL
+    assert main._access_ttu(None, (1010, {}), 1000) == 1010
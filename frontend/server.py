@@ -1,52 +1,110 @@
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.cors import CORSMiddleware
+import gzip
+import hashlib
+import mimetypes
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
 from pathlib import Path
 
-app = FastAPI()
+try:
+    import brotli  # Optional: adds a "br" variant when installed
+except ImportError:
+    brotli = None
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app = FastAPI()
 
 # Get the current directory
 FRONTEND_DIR = Path(__file__).parent
 
-@app.get("/")
-async def read_root():
-    """Serve the login page"""
-    return FileResponse(FRONTEND_DIR / "index.html")
+# Files the browser may fetch; everything else in this directory (server.py, README.md, ...) stays private
+PUBLIC_FILES = frozenset({"index.html", "chat.html", "style.css", "login.js", "chat.js"})
+
+
+def load_asset(name: str) -> dict:
+    """
+    Read a frontend file into memory along with its precompressed encodings.
+    Encodings that don't make the file smaller are left out.
+    """
+    path = FRONTEND_DIR / name
+    raw = path.read_bytes()
+
+    encodings = {"gzip": gzip.compress(raw, compresslevel=9)}
+    if brotli:
+        encodings["br"] = brotli.compress(raw, quality=11)
+
+    return {
+        "mtime": path.stat().st_mtime_ns,
+        "media_type": mimetypes.guess_type(name)[0],
+        "etag": f'W/"{hashlib.blake2b(raw, digest_size=8).hexdigest()}"',
+        "identity": raw,
+        "encodings": {encoding: body for encoding, body in encodings.items() if len(body) < len(raw)},
+    }
+
+
+# Loaded once at startup instead of read (and sent uncompressed) on every request
+# Bodies come from memory, so there is no file for sendfile-style zero-copy to hand off
+ASSETS = {name: load_asset(name) for name in PUBLIC_FILES}
+
+
+def get_asset(name: str) -> dict:
+    """Get a frontend file, reloading it if it changed on disk since it was loaded"""
+    asset = ASSETS[name]
+    if (FRONTEND_DIR / name).stat().st_mtime_ns != asset["mtime"]:
+        asset = ASSETS[name] = load_asset(name)
+    return asset
 
-@app.get("/index.html")
-async def read_index():
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Content codings from an Accept-Encoding header, minus any refused with q=0"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+def serve_asset(name: str, request: Request) -> Response:
+    """
+    Serve a frontend file from memory, brotli or gzip encoded when the client accepts it.
+    Cache-Control: no-cache makes browsers revalidate with the ETag, so unchanged files
+    come back as an empty 304.
+    """
+    asset = get_asset(name)
+    headers = {"ETag": asset["etag"], "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if request.headers.get("if-none-match") == asset["etag"]:
+        return Response(status_code=304, headers=headers)
+
+    body = asset["identity"]
+    accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+    for encoding in ("br", "gzip"):
+        if encoding in asset["encodings"] and encoding in accepted:
+            body = asset["encodings"][encoding]
+            headers["Content-Encoding"] = encoding
+            break
+
+    return Response(content=body, media_type=asset["media_type"], headers=headers)
+
+
+@app.api_route("/", methods=["GET", "HEAD"])
+async def read_root(request: Request):
     """Serve the login page"""
-    return FileResponse(FRONTEND_DIR / "index.html")
-
-@app.get("/chat.html")
-async def read_chat():
-    """Serve the chat page"""
-    return FileResponse(FRONTEND_DIR / "chat.html")
-
-@app.get("/style.css")
-async def read_style():
-    """Serve the CSS file"""
-    return FileResponse(FRONTEND_DIR / "style.css")
-
-@app.get("/login.js")
-async def read_login_js():
-    """Serve the login JS file"""
-    return FileResponse(FRONTEND_DIR / "login.js")
-
-@app.get("/chat.js")
-async def read_chat_js():
-    """Serve the chat JS file"""
-    return FileResponse(FRONTEND_DIR / "chat.js")
+    return serve_asset("index.html", request)
+
+
+@app.api_route("/{name}", methods=["GET", "HEAD"])
+async def read_asset(name: str, request: Request):
+    """Serve one of the public frontend files"""
+    if name not in PUBLIC_FILES:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return serve_asset(name, request)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,58 +1,189 @@
 import os
+import re
+import asyncio
+import hashlib
+from collections import deque
+from email.utils import format_datetime
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from pathlib import Path
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
+from cachetools import LRUCache, TTLCache
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient
 from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.transport import AioHttpTransport
+import aiohttp
 from dotenv import load_dotenv
 import io
 
 load_dotenv()
 
-app = FastAPI()
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
 # Azure Blob Storage configuration
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 AZURE_STORAGE_CONTAINER_NAME = os.getenv("AZURE_STORAGE_CONTAINER", "uploads")
 
-# Initialize Azure Blob Storage client
+# Supported video extensions and the content type each is stored with
+CONTENT_TYPE_MAP = {
+    '.mp4': 'video/mp4',
+    '.webm': 'video/webm',
+    '.ogg': 'video/ogg',
+    '.avi': 'video/x-msvideo',
+    '.mov': 'video/quicktime',
+    '.mkv': 'video/x-matroska'
+}
+ALLOWED_VIDEO_EXTENSIONS = frozenset(CONTENT_TYPE_MAP)
+ALLOWED_VIDEO_EXTENSIONS_MSG = ', '.join(CONTENT_TYPE_MAP)
+
+# Uploads are read from the request in blocks of this size instead of all at once
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Uploads larger than UPLOAD_SINGLE_PUT_SIZE are staged as UPLOAD_BLOCK_SIZE blocks,
+# with up to UPLOAD_CONCURRENCY blocks uploading in parallel
+UPLOAD_BLOCK_SIZE = 4 * 1024 * 1024
+UPLOAD_SINGLE_PUT_SIZE = 64 * 1024 * 1024
+UPLOAD_CONCURRENCY = 8
+
+# Ranged downloads are split into parts of DOWNLOAD_PART_SIZE bytes, with up to
+# DOWNLOAD_CONCURRENCY parts in flight per stream (so at most 32 MiB buffered per stream).
+# The first part is kept small so playback can start before a full part has arrived.
+FIRST_DOWNLOAD_PART_SIZE = 256 * 1024
+DOWNLOAD_PART_SIZE = 4 * 1024 * 1024
+DOWNLOAD_CONCURRENCY = 8
+
+# Open-ended ranges ("bytes=<start>-") are answered with at most this many bytes; players
+# request the next range when they need it instead of holding one response open for the whole file
+MAX_RANGE_BYTES = int(os.getenv("MAX_RANGE_BYTES", 4 * 1024 * 1024))
+
+# Blobs per list page; 5000 is the service maximum, so large containers are listed in as few round trips as possible
+LIST_BLOBS_PAGE_SIZE = 5000
+
+# Single byte range: "bytes=<start>-<end>", "bytes=<start>-" or "bytes=-<suffix length>"
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+# Clients may reuse a video listing for this long before revalidating it with its ETag
+VIDEO_LIST_MAX_AGE = 60
+
+# (size, content_type, etag, last_modified) of recently streamed blobs, so range requests skip the properties round trip.
+# Entries are dropped when a blob is uploaded or deleted through this service.
+blob_properties_cache = TTLCache(maxsize=1024, ttl=60)
+
+# One aiohttp connection pool for all Azure traffic, large enough for many concurrent streams
+# (each stream keeps up to DOWNLOAD_CONCURRENCY part downloads in flight) and kept alive between range requests
+AZURE_HTTP_MAX_CONNECTIONS = 256
+AZURE_HTTP_KEEPALIVE_TIMEOUT = 75
+
+# Async Azure Blob Storage clients, created in lifespan so they share the event loop
+azure_http_session = None
 blob_service_client = None
 container_client = None
 
-if AZURE_STORAGE_CONNECTION_STRING:
+# BlobClient per blob name, reused across the many range requests a player sends for one video.
+# They share the container client's HTTP pipeline, so caching them holds no extra connections.
+blob_clients = LRUCache(maxsize=1024)
+
+# Whole contents of small, recently streamed videos as {name: (etag, memoryview)}, up to HOT_BLOBS_MAX_BYTES in total.
+# A video is filled in the background after its first request and served from memory after that.
+# Entries are dropped when a blob is uploaded or deleted through this service; a blob overwritten elsewhere
+# is only noticed when its etag in blob_properties_cache refreshes, so it may be served stale for up to 60 s.
+HOT_BLOB_MAX_SIZE = int(os.getenv("HOT_BLOB_MAX_SIZE", 32 * 1024 * 1024))
+HOT_BLOBS_MAX_BYTES = int(os.getenv("HOT_BLOBS_MAX_BYTES", 512 * 1024 * 1024))
+hot_blobs = LRUCache(maxsize=HOT_BLOBS_MAX_BYTES, getsizeof=lambda entry: len(entry[1]))
+hot_blob_fills = {}
+
+
+def get_extension(filename: str) -> str:
+    """Lowercased extension with its dot ("" if there is none), without building a Path"""
+    _, dot, extension = filename.rpartition(".")
+    return f".{extension.lower()}" if dot else ""
+
+
+def get_blob_client(blob_name: str):
+    """Get the cached BlobClient for a blob, creating it on first use"""
+    blob_client = blob_clients.get(blob_name)
+    if blob_client is None:
+        blob_client = blob_clients[blob_name] = container_client.get_blob_client(blob_name)
+    return blob_client
+
+
+async def fill_hot_blob(blob_client, video_name: str):
+    """Download a small video in full and keep it in hot_blobs"""
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
-        
-        # Create container if it doesn't exist
+        downloader = await blob_client.download_blob()
+        data = await downloader.readall()
+        hot_blobs[video_name] = (downloader.properties.etag, memoryview(data))
+    except Exception as e:
+        print(f"Failed to cache video {video_name}: {e}")
+    finally:
+        hot_blob_fills.pop(video_name, None)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the Azure Blob Storage client on startup and close it on shutdown"""
+    global azure_http_session, blob_service_client, container_client
+    
+    if AZURE_STORAGE_CONNECTION_STRING:
         try:
-            container_client.create_container()
-            print(f"Created Azure Blob container: {AZURE_STORAGE_CONTAINER_NAME}")
+            azure_http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=AZURE_HTTP_MAX_CONNECTIONS,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=AZURE_HTTP_KEEPALIVE_TIMEOUT
+                )
+            )
+            blob_service_client = BlobServiceClient.from_connection_string(
+                AZURE_STORAGE_CONNECTION_STRING,
+                transport=AioHttpTransport(session=azure_http_session, session_owner=False),
+                max_block_size=UPLOAD_BLOCK_SIZE,
+                max_single_put_size=UPLOAD_SINGLE_PUT_SIZE
+            )
+            container_client = blob_service_client.get_container_client(AZURE_STORAGE_CONTAINER_NAME)
+            
+            # Create container if it doesn't exist
+            try:
+                await container_client.create_container()
+                print(f"Created Azure Blob container: {AZURE_STORAGE_CONTAINER_NAME}")
+            except Exception as e:
+                if "ContainerAlreadyExists" in str(e):
+                    print(f"Using existing Azure Blob container: {AZURE_STORAGE_CONTAINER_NAME}")
+                else:
+                    print(f"Container creation error: {e}")
         except Exception as e:
-            if "ContainerAlreadyExists" in str(e):
-                print(f"Using existing Azure Blob container: {AZURE_STORAGE_CONTAINER_NAME}")
-            else:
-                print(f"Container creation error: {e}")
-    except Exception as e:
-        print(f"Failed to initialize Azure Blob Storage: {e}")
-        print("Make sure AZURE_STORAGE_CONNECTION_STRING is set in .env file")
-else:
-    print("AZURE_STORAGE_CONNECTION_STRING not found in environment variables")
-    print("Video upload and streaming features will not work")
+            print(f"Failed to initialize Azure Blob Storage: {e}")
+            print("Make sure AZURE_STORAGE_CONNECTION_STRING is set in .env file")
+    else:
+        print("AZURE_STORAGE_CONNECTION_STRING not found in environment variables")
+        print("Video upload and streaming features will not work")
+    
+    yield
+    
+    for task in hot_blob_fills.values():
+        task.cancel()
+    blob_clients.clear()
+    if blob_service_client:
+        await blob_service_client.close()
+    if azure_http_session:
+        await azure_http_session.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Explicit origins (comma separated in CORS_ORIGINS), methods and headers instead of wildcards.
+# Requests without an Origin header (e.g. <video> range reads) pass straight through.
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000,http://localhost:3001,http://127.0.0.1:3001").split(",")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=True,
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["content-type", "range"],
+)
+
+# Mount static files
+app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
 @app.get("/")
@@ -68,72 +199,116 @@ async def upload_video(file: UploadFile = File(...)):
         raise HTTPException(status_code=503, detail="Azure Blob Storage not configured")
     
     # Validate file type
-    allowed_extensions = ['.mp4', '.webm', '.ogg', '.avi', '.mov', '.mkv']
-    file_extension = Path(file.filename).suffix.lower()
+    file_extension = get_extension(file.filename)
     
-    if file_extension not in allowed_extensions:
+    if file_extension not in ALLOWED_VIDEO_EXTENSIONS:
         raise HTTPException(
             status_code=400, 
-            detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+            detail=f"Invalid file type. Allowed: {ALLOWED_VIDEO_EXTENSIONS_MSG}"
         )
     
     try:
         # Upload to Azure Blob Storage
-        blob_client = container_client.get_blob_client(file.filename)
+        blob_client = get_blob_client(file.filename)
         
-        # Read file content
-        content = await file.read()
+        # Stream the file to Azure in blocks, counting bytes as they pass, so the
+        # whole video is never held in memory
+        size = 0
         
-        # Upload with content type
-        content_type_map = {
-            '.mp4': 'video/mp4',
-            '.webm': 'video/webm',
-            '.ogg': 'video/ogg',
-            '.avi': 'video/x-msvideo',
-            '.mov': 'video/quicktime',
-            '.mkv': 'video/x-matroska'
-        }
+        async def file_chunks():
+            nonlocal size
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                yield chunk
         
-        blob_client.upload_blob(
-            content,
+        # Upload with content type
+        await blob_client.upload_blob(
+            file_chunks(),
+            length=file.size,  # Known from the multipart parser, lets small files go up in a single put
             overwrite=True,
-            content_settings={
-                'content_type': content_type_map.get(file_extension, 'video/mp4')
-            }
+            max_concurrency=UPLOAD_CONCURRENCY,
+            content_settings=ContentSettings(
+                content_type=CONTENT_TYPE_MAP[file_extension]
+            )
         )
+        blob_properties_cache.pop(file.filename, None)
+        hot_blobs.pop(file.filename, None)
         
         return {
             "message": "Video uploaded successfully",
             "filename": file.filename,
-            "size": len(content)
+            "size": size
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
 @app.get("/api/videos")
-async def list_videos():
+async def list_videos(request: Request):
     """List available videos from Azure Blob Storage"""
     if not container_client:
         raise HTTPException(status_code=503, detail="Azure Blob Storage not configured")
     
     try:
         videos = []
-        blob_list = container_client.list_blobs()
-        
-        for blob in blob_list:
+        # Videos are stored at the container root (no prefix to narrow by); no metadata/tags are requested
+        async for blob in container_client.list_blobs(results_per_page=LIST_BLOBS_PAGE_SIZE):
             # Filter video files
-            if Path(blob.name).suffix.lower() in ['.mp4', '.webm', '.ogg', '.avi', '.mov', '.mkv']:
+            if get_extension(blob.name) in ALLOWED_VIDEO_EXTENSIONS:
                 videos.append({
                     "name": blob.name,
                     "size": blob.size
                 })
         
-        return {"videos": videos}
+        # Weak ETag over the listing, so an unchanged listing is answered with an empty 304
+        digest = hashlib.blake2b(digest_size=16)
+        for video in sorted(videos, key=lambda video: video["name"]):
+            digest.update(f"{video['name']}\0{video['size']}\0".encode())
+        etag = f'W/"{digest.hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={VIDEO_LIST_MAX_AGE}"}
+        
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse({"videos": videos}, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list videos: {str(e)}")
 
 
+async def iter_blob_range(blob_client, offset: int, length: int):
+    """
+    Yield `length` bytes of a blob starting at `offset`.
+    The range is fetched as concurrent sub-range requests, and the parts are
+    yielded strictly in order. StreamingResponse sends each part as soon as it is
+    yielded, so the small first part reaches the player without waiting for the rest.
+    """
+    async def fetch(part_offset: int, part_length: int) -> bytes:
+        downloader = await blob_client.download_blob(offset=part_offset, length=part_length)
+        return await downloader.readall()
+    
+    def parts():
+        end = offset + length
+        part_offset, part_size = offset, FIRST_DOWNLOAD_PART_SIZE
+        while part_offset < end:
+            part_length = min(part_size, end - part_offset)
+            yield part_offset, part_length
+            part_offset += part_length
+            part_size = DOWNLOAD_PART_SIZE
+    
+    in_flight = deque()
+    try:
+        for part in parts():
+            in_flight.append(asyncio.create_task(fetch(*part)))
+            if len(in_flight) < DOWNLOAD_CONCURRENCY:
+                continue
+            yield await in_flight.popleft()
+        while in_flight:
+            yield await in_flight.popleft()
+    finally:
+        # Client went away or a part failed: don't leave downloads running
+        for task in in_flight:
+            task.cancel()
+
+
 @app.get("/api/stream/{video_name}")
 async def stream_video(video_name: str, request: Request):
     """Stream video from Azure Blob Storage with range support"""
@@ -141,50 +316,91 @@ async def stream_video(video_name: str, request: Request):
         raise HTTPException(status_code=503, detail="Azure Blob Storage not configured")
     
     try:
-        blob_client = container_client.get_blob_client(video_name)
+        blob_client = get_blob_client(video_name)
+        
+        # Check if blob exists (cached, browsers send many range requests per video)
+        cached = blob_properties_cache.get(video_name)
+        if cached is None:
+            blob_properties = await blob_client.get_blob_properties()
+            cached = (
+                blob_properties.size,
+                blob_properties.content_settings.content_type or "video/mp4",
+                blob_properties.etag,
+                format_datetime(blob_properties.last_modified, usegmt=True)
+            )
+            blob_properties_cache[video_name] = cached
+        file_size, content_type, etag, last_modified = cached
         
-        # Check if blob exists
-        blob_properties = blob_client.get_blob_properties()
-        file_size = blob_properties.size
-        content_type = blob_properties.content_settings.content_type or "video/mp4"
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": f"inline; filename={video_name}",
+            "ETag": etag,
+            "Last-Modified": last_modified,
+        }
         
         # Parse range header for seeking support
         range_header = request.headers.get("range")
+        
+        # If-Range: only honor the range if the client's copy is still current, otherwise send the whole file
+        if_range = request.headers.get("if-range")
+        if range_header and if_range and if_range not in (etag, last_modified):
+            range_header = None
+        
+        # Unchanged since the client's copy: nothing to send
+        if not range_header and request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        
         start = 0
         end = file_size - 1
         
         if range_header:
-            range_match = range_header.replace("bytes=", "").split("-")
-            start = int(range_match[0]) if range_match[0] else 0
-            end = int(range_match[1]) if len(range_match) > 1 and range_match[1] else end
-        
-        content_length = end - start + 1
+            if "," in range_header:
+                # Multiple ranges would need a multipart/byteranges response, which is not supported
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+            
+            range_match = RANGE_RE.fullmatch(range_header.strip())
+            first, last = range_match.groups() if range_match else ("", "")
+            if first:
+                start = int(first)
+                end = int(last) if last else min(end, start + MAX_RANGE_BYTES - 1)
+            elif last:
+                # Suffix range: the final <last> bytes of the file
+                start = max(0, file_size - int(last))
+            else:
+                # Not a byte range we understand: ignore it and send the whole file
+                range_header = None
         
-        # Download blob with range
-        def iter_blob():
-            stream = blob_client.download_blob(offset=start, length=content_length)
-            for chunk in stream.chunks():
-                yield chunk
+        if range_header:
+            # Starting past the end can't be served; an end past the file is just trimmed
+            if start >= file_size or end < start:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}"})
+            end = min(end, file_size - 1)
         
-        headers = {
-            "Accept-Ranges": "bytes",
-            "Content-Disposition": f"inline; filename={video_name}",
-        }
+        content_length = end - start + 1
         
-        # If range request, return 206 Partial Content
+        # If range request, return 206 Partial Content, otherwise the full file
+        status_code = 200
         if range_header:
+            status_code = 206
             headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
             headers["Content-Length"] = str(content_length)
-            return StreamingResponse(
-                iter_blob(),
-                status_code=206,
-                media_type=content_type,
-                headers=headers
-            )
         
-        # Full file request
+        # Small videos are served from memory once cached, while their etag matches the cached blob properties
+        if file_size <= HOT_BLOB_MAX_SIZE:
+            hot_blob = hot_blobs.get(video_name)
+            if hot_blob is not None and hot_blob[0] == etag:
+                return Response(
+                    content=hot_blob[1][start:end + 1],
+                    status_code=status_code,
+                    media_type=content_type,
+                    headers=headers
+                )
+            if video_name not in hot_blob_fills:
+                hot_blob_fills[video_name] = asyncio.create_task(fill_hot_blob(blob_client, video_name))
+        
         return StreamingResponse(
-            iter_blob(),
+            iter_blob_range(blob_client, start, content_length),
+            status_code=status_code,
             media_type=content_type,
             headers=headers
         )
@@ -202,8 +418,11 @@ async def delete_video(video_name: str):
         raise HTTPException(status_code=503, detail="Azure Blob Storage not configured")
     
     try:
-        blob_client = container_client.get_blob_client(video_name)
-        blob_client.delete_blob()
+        blob_client = get_blob_client(video_name)
+        await blob_client.delete_blob()
+        blob_properties_cache.pop(video_name, None)
+        hot_blobs.pop(video_name, None)
+        blob_clients.pop(video_name, None)
         
         return {"message": f"Video '{video_name}' deleted successfully"}
     except ResourceNotFoundError: